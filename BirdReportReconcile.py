@@ -0,0 +1,213 @@
+import os
+import hashlib
+import argparse
+import requests
+import pandas as pd
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib3.util import Retry
+from requests.adapters import HTTPAdapter
+
+from BirdReportSync import BirdReportSync
+from EBirdChecklistManager import EBirdChecklistManager
+from ObservationWarehouse import ObservationWarehouse
+
+ACTIVITY_LIST_URL = "https://api.birdreport.cn/member/system/activity/list"
+ACTIVITY_TAXON_URL = "https://api.birdreport.cn/member/system/activity/taxon"
+
+
+def fingerprint(records):
+    """(中文名, 数量) 列表 -> (指纹, 按鸟种汇总的数量)；同名鸟种数量相加，与顺序无关"""
+    counts = Counter()
+    for name, count in records:
+        counts[str(name).strip()] += int(count)
+    digest = hashlib.sha1("|".join(f"{k}:{v}" for k, v in sorted(counts.items())).encode("utf-8")).hexdigest()
+    return digest[:12], counts
+
+
+def describe_diff(ebird_counts, br_counts):
+    """列出 eBird 与观鸟记录中心不一致的鸟种，如 "白头鹎 3->5; -麻雀; +树麻雀" """
+    changes = []
+    for name in sorted(set(ebird_counts) | set(br_counts)):
+        e, b = ebird_counts.get(name), br_counts.get(name)
+        if b is None:
+            changes.append(f"+{name}")
+        elif e is None:
+            changes.append(f"-{name}")
+        elif e != b:
+            changes.append(f"{name} {b}->{e}")
+    return "; ".join(changes)
+
+
+class BirdReportReconciler(BirdReportSync):
+    """对账：找出观鸟记录中心缺失、过期（eBird 上改过）、重复同步的中国清单"""
+
+    def __init__(self, config_path, library_path, max_workers=8, page_size=100, db_path=None, refresh=False):
+        super().__init__(config_path, library_path)
+        self.max_workers = max_workers
+        self.page_size = page_size
+        # eBird 一侧优先读本地观测记录库，只下载库里没有的鸟单；refresh 时全部重新下载入库
+        self.warehouse = ObservationWarehouse(db_path, library_path, config_path, max_workers) \
+            if db_path else None
+        self.refresh = refresh
+        self.headers = {"Content-Type": "application/json", "X-Auth-Token": self.br_token,
+                        "Referer": "https://www.birdreport.cn/"}
+
+        # 并发请求时连接池要够大；eBird 下载只重试 GET
+        retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+        self.session.mount('https://', HTTPAdapter(max_retries=retries, pool_maxsize=max_workers))
+        # 活动列表/鸟种记录是只读查询，虽然是 POST 也可以重试；用单独的 Session，避免 saveReport 被重复提交
+        self.query_session = requests.Session()
+        self.query_session.headers.update(self.session.headers)
+        query_retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504], allowed_methods=None)
+        self.query_session.mount('https://', HTTPAdapter(max_retries=query_retries, pool_maxsize=max_workers))
+
+    # ---------------- 观鸟记录中心 ----------------
+
+    def fetch_activity_page(self, page):
+        """取一页活动记录，返回 (总数, 记录列表)"""
+        resp = self.query_session.post(ACTIVITY_LIST_URL, json={"page": page, "limit": self.page_size},
+                                       headers=self.headers)
+        resp.raise_for_status()
+        body = resp.json()
+        return body.get("count"), body.get("data") or []
+
+    def fetch_activities(self):
+        """拉取全部活动：先取第一页拿总数，其余页并发请求"""
+        total, rows = self.fetch_activity_page(1)
+        if total is not None:
+            pages = range(2, (int(total) + self.page_size - 1) // self.page_size + 1)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                for _, page_rows in pool.map(self.fetch_activity_page, pages):
+                    rows.extend(page_rows)
+        else:  # 接口没给总数就顺序翻页，直到取不满一页
+            page, page_rows = 1, rows
+            while len(page_rows) >= self.page_size:
+                page += 1
+                _, page_rows = self.fetch_activity_page(page)
+                rows.extend(page_rows)
+
+        df = pd.DataFrame([{
+            "activity_id": str(item.get("id") or item.get("activity_id")),
+            "note": item.get("note") or "",
+            "start_time": item.get("start_time", ""),
+        } for item in rows], columns=["activity_id", "note", "start_time"])
+        # sync_to_birdreport 写入的备注："Imported from eBird {subid}"
+        df["sub_id"] = df["note"].str.extract(r"Imported from eBird (S\d+)", expand=False)
+        print(f"[+] 观鸟记录中心活动 {len(df)} 条，其中来自 eBird {df['sub_id'].notna().sum()} 条")
+        return df
+
+    def fetch_activity_records(self, activity_id):
+        """取某次活动的鸟种记录，返回 (中文名, 数量) 列表"""
+        resp = self.query_session.post(ACTIVITY_TAXON_URL, json={"activity_id": activity_id},
+                                       headers=self.headers)
+        resp.raise_for_status()
+        return [(item.get("taxon_name"), item.get("taxon_count") or 0) for item in resp.json().get("data") or []]
+
+    # ---------------- eBird ----------------
+
+    def fetch_ebird_checklists(self):
+        df = pd.DataFrame(EBirdChecklistManager.fetch_all_checklists(self.session),
+                          columns=["checklist ID", "日期/时间", "地点", "is_china", "国家", "州/省", "郡/县"])
+        print(f"[+] eBird 清单 {len(df)} 条，其中中国 {df['is_china'].sum()} 条")
+        return df.drop_duplicates(subset=["checklist ID"]).set_index("checklist ID")
+
+    def load_ebird_records(self, sub_ids):
+        """从观测记录库取鸟单的 (中文名, 数量) 列表；库里没有的先下载入库，入库失败的不返回（对账时再单独下载）"""
+        if self.warehouse is None:
+            return {}
+        cached = set() if self.refresh else self.warehouse.synced_ids()
+        todo = [s for s in sub_ids if s not in cached]
+        if todo:
+            self.warehouse.sync(todo, refresh=True, session=self.session)
+
+        wanted = set(sub_ids) & self.warehouse.synced_ids()
+        records = {sub_id: [] for sub_id in wanted}
+        # 数量与 _to_records 一致：非数字（X）按 1 计
+        for sub_id, species, count in self.warehouse.conn.execute("SELECT sub_id, species, count FROM observations"):
+            if sub_id in wanted:
+                records[sub_id].append((self._get_final_cn_name(species), count or 1))
+        print(f"[+] 观测记录库提供 {len(records)} 个鸟单，本次下载 {len(todo)} 个")
+        return records
+
+    # ---------------- 对账 ----------------
+
+    def _compare(self, sub_id, activity_id, ebird_records=None):
+        """比对 eBird 鸟单（没有本地记录时现下载）和活动记录的指纹"""
+        try:
+            if ebird_records is None:
+                ebird_records = self._to_records(self.download_checklist(sub_id))
+            e_fp, e_counts = fingerprint(ebird_records)
+            b_fp, b_counts = fingerprint(self.fetch_activity_records(activity_id))
+        except Exception as e:
+            return {"sub_id": sub_id, "activity_id": activity_id, "error": str(e)}
+        return {"sub_id": sub_id, "activity_id": activity_id, "ebird_fp": e_fp, "birdreport_fp": b_fp,
+                "diff": describe_diff(e_counts, b_counts) if e_fp != b_fp else ""}
+
+    def reconcile(self, output_dir="resource/reconcile"):
+        """生成 missing / stale / duplicate / orphan 对账表（比对出错的另记 failed），subID 可直接用于重新同步"""
+        ebird = self.fetch_ebird_checklists()
+        activities = self.fetch_activities()
+
+        synced = activities.dropna(subset=["sub_id"])
+        by_sub = synced.groupby("sub_id")["activity_id"].agg(list)
+
+        china_ids = set(ebird.index[ebird["is_china"].astype(bool)])
+        br_ids = set(by_sub.index)
+
+        # 1. 缺失：中国清单但观鸟记录中心没有
+        missing = ebird.loc[sorted(china_ids - br_ids), ["日期/时间", "地点", "州/省"]]
+        missing = missing.rename_axis("sub_id").reset_index()
+
+        # 2. 重复：同一个 subID 被同步了多次
+        dup = by_sub[by_sub.str.len() > 1]
+        duplicate = pd.DataFrame({"sub_id": dup.index, "activity_ids": dup.map(",".join).values})
+
+        # 3. 孤立：观鸟记录中心有，但不在 eBird 的中国清单里（已删除或非中国清单）
+        orphan = synced[~synced["sub_id"].isin(china_ids)][["sub_id", "activity_id", "start_time"]]
+
+        # 4. 过期：两边都有，比对鸟种/数量指纹（重复的取最新一条活动）
+        common = sorted(china_ids & br_ids)
+        latest = {sub_id: max(by_sub[sub_id], key=lambda x: int(x) if x.isdigit() else 0) for sub_id in common}
+        ebird_records = self.load_ebird_records(common)
+        print(f"[*] 正在比对 {len(common)} 条已同步清单...")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = list(pool.map(lambda s: self._compare(s, latest[s], ebird_records.get(s)), common))
+        compared = pd.DataFrame(results, columns=["sub_id", "activity_id", "ebird_fp", "birdreport_fp", "diff", "error"])
+        stale = compared[compared["error"].isna() & (compared["ebird_fp"] != compared["birdreport_fp"])]
+        failed = compared[compared["error"].notna()]
+
+        report = {"missing": missing, "stale": stale.drop(columns=["error"]), "duplicate": duplicate,
+                  "orphan": orphan, "failed": failed[["sub_id", "activity_id", "error"]]}
+        os.makedirs(output_dir, exist_ok=True)
+        for name, df in report.items():
+            df.to_csv(os.path.join(output_dir, f"{name}.csv"), index=False, encoding="utf-8-sig")
+
+        print(f"[+] 对账完成：缺失 {len(missing)}，过期 {len(stale)}，重复 {len(duplicate)}，"
+              f"孤立 {len(orphan)}，比对失败 {len(failed)}；结果已写入 {output_dir}")
+        return report
+
+    def resync(self, sub_ids, target_point_id):
+        """把对账结果中的清单重新同步到观鸟记录中心（过期的清单需先在网站上删除旧活动）"""
+        for sub_id in sub_ids:
+            try:
+                self.sync_to_birdreport(sub_id, target_point_id)
+            except Exception as e:
+                print(f"[-] 同步失败 {sub_id}: {e}")
+
+
+# ================= 运行 =================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="eBird 与观鸟记录中心对账")
+    parser.add_argument("--output-dir", default="resource/reconcile")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--db", default="resource/observations.db", help="观测记录库，已入库的鸟单不再下载")
+    parser.add_argument("--refresh", action="store_true", help="重新下载全部已同步清单并更新观测记录库")
+    parser.add_argument("--resync-missing", type=int, metavar="POINT_ID", help="对账后把缺失的清单同步到指定点位")
+    args = parser.parse_args()
+
+    reconciler = BirdReportReconciler("secrets.ini", "resource/bird_species_library.xlsx", max_workers=args.workers,
+                                      db_path=args.db, refresh=args.refresh)
+    report = reconciler.reconcile(args.output_dir)
+    if args.resync_missing:
+        reconciler.resync(report["missing"]["sub_id"], args.resync_missing)
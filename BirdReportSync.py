@@ -12,6 +12,54 @@ from bs4 import BeautifulSoup
 from EBirdSessionManager import EBirdSessionManager
 
 
+def load_species_library(library_path):
+    """预加载鸟种库，解决拉丁名匹配问题"""
+    if not os.path.exists(library_path):
+        print(f"[-] 警告: 库文件 {library_path} 不存在")
+        return {}
+    try:
+        return pd.read_excel(library_path, engine='openpyxl', dtype=str)
+    except Exception as e:
+        print(f"[-] 库文件加载失败: {e}")
+        return {}
+
+
+class SpeciesNameLookup:
+    """鸟种库查名：先按拉丁名，查不到再按手动维护的 ebird 名，都查不到用原名"""
+
+    def __init__(self, species_df):
+        self.latin_map, self.ebird_map = self._build_name_maps(species_df)
+
+    @staticmethod
+    def _build_name_maps(species_df):
+        """生成 拉丁名->中文名、ebird名->中文名 两张查找表（同名取第一行），避免每个鸟种都扫一遍表"""
+        if not isinstance(species_df, pd.DataFrame) or species_df.empty:
+            return {}, {}
+        try:
+            cn = species_df['中文名'].astype(str).str.strip()
+            rows = list(zip(species_df['拉丁名'].str.strip(), species_df['ebird'].str.strip(), cn))
+            latin_map = {latin: name for latin, _, name in reversed(rows) if pd.notna(latin)}
+            ebird_map = {ebird: name for _, ebird, name in reversed(rows) if pd.notna(ebird)}
+            return latin_map, ebird_map
+        except Exception as e:
+            print(f"[-] 鸟种查找表生成失败: {e}")
+            return {}, {}
+
+    def cn_name(self, full_name_str):
+        """解析 "名字 (拉丁名)" 并映射中文名"""
+        brackets = re.findall(r'\(([^)]+)\)', full_name_str)
+        if not brackets:
+            return full_name_str.split("(")[0].strip()
+
+        latin = brackets[-1].split('/')[0].strip()
+        if latin in self.latin_map:
+            return self.latin_map[latin]
+        if brackets[0] in self.ebird_map:  # 如果latin查不到，差ebird列（手动维护）
+            return self.ebird_map[brackets[0]]
+
+        return full_name_str.split("(")[0].strip()
+
+
 class BirdReportSync(EBirdSessionManager):
     def __init__(self, config_path, library_path):
         """初始化配置并加载凭据"""
@@ -27,46 +75,17 @@ class BirdReportSync(EBirdSessionManager):
         self.session.headers.update({
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/144.0.0.0 Safari/537.36"
         })
-        self.species_df = self._load_species_library()
+        self.species_df = load_species_library(library_path)
+        self.name_lookup = SpeciesNameLookup(self.species_df)
         super().__init__()
         self.get_valid_session()
 
-    def _load_species_library(self):
-        """预加载鸟种库，解决拉丁名匹配问题"""
-        if not os.path.exists(self.library_path):
-            print(f"[-] 警告: 库文件 {self.library_path} 不存在")
-            return {}
-        try:
-            df = pd.read_excel(self.library_path, engine='openpyxl', dtype=str)
-            # 使用小写拉丁名作为键，实现不区分大小写的匹配
-            return df
-        except Exception as e:
-            print(f"[-] 库文件加载失败: {e}")
-            return {}
-
     def _get_final_cn_name(self, full_name_str):
         """解析拉丁名并查表映射中文名"""
-        brackets = re.findall(r'\(([^)]+)\)', full_name_str)
-        if not brackets:
-            return full_name_str.split("(")[0].strip()
-
-        latin = brackets[-1].split('/')[0].strip()
-        try:
-            result = self.species_df[self.species_df['拉丁名'].str.strip() == latin]
-            if not result.empty:
-                return str(result.iloc[0]['中文名']).strip()
-            else:  # 如果latin查不到，差ebird列（手动维护）
-                result = self.species_df[self.species_df['ebird'].str.strip() == brackets[0]]
-                if not result.empty:
-                    return str(result.iloc[0]['中文名']).strip()
-        except Exception as e:
-            print(f"[-] 查表匹配失败 ({latin}): {e}")
-
-        return full_name_str.split("(")[0].strip()
+        return self.name_lookup.cn_name(full_name_str)
 
-    def fetch_and_transform(self, ebird_subid):
-        """下载 eBird 鸟单并转换为上传模板"""
-        print(f"[*] 正在下载清单数据: {ebird_subid}")
+    def download_checklist(self, ebird_subid):
+        """下载 eBird 鸟单 CSV"""
         url = f"https://ebird.org/ebird/checklist/download?subID={ebird_subid}"
 
         # 直接使用登录后的 session 请求
@@ -74,7 +93,17 @@ class BirdReportSync(EBirdSessionManager):
         if resp.status_code != 200:
             raise Exception("鸟单下载失败，请确认是否已成功登录 eBird")
 
-        df = pd.read_csv(io.StringIO(resp.text))
+        return pd.read_csv(io.StringIO(resp.text))
+
+    def _to_records(self, df):
+        """鸟单转为 (中文名, 数量) 列表，与上传到观鸟记录中心的内容一致"""
+        return [(self._get_final_cn_name(species), int(count) if str(count).isdigit() else 1)
+                for species, count in zip(df['Species'], df['Count'])]
+
+    def fetch_and_transform(self, ebird_subid):
+        """下载 eBird 鸟单并转换为上传模板"""
+        print(f"[*] 正在下载清单数据: {ebird_subid}")
+        df = self.download_checklist(ebird_subid)
 
         # 时间圆整处理
         date_val = df['Observation Date'].iloc[0]
@@ -105,9 +134,9 @@ class BirdReportSync(EBirdSessionManager):
         sheet.write(0, 0, "中文名");
         sheet.write(0, 1, "数量")
 
-        for i, row in df.iterrows():
-            sheet.write(i + 1, 0, self._get_final_cn_name(row['Species']))
-            sheet.write(i + 1, 1, int(row['Count']) if str(row['Count']).isdigit() else 1)
+        for i, (name, count) in enumerate(self._to_records(df)):
+            sheet.write(i + 1, 0, name)
+            sheet.write(i + 1, 1, count)
 
         workbook.save(xls_filename)
         return {"start": final_start.strftime("%Y-%m-%d %H:%M:%S"), "end": final_end.strftime("%Y-%m-%d %H:%M:%S"),
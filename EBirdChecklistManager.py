@@ -30,7 +30,34 @@ class EBirdChecklistManager(EBirdSessionManager):
             print("[-] 无法访问清单页面，请检查登录状态")
             return []
 
-        soup = BeautifulSoup(response.text, 'html.parser')
+        return self.parse_checklists(response.text)
+
+    @staticmethod
+    def fetch_all_checklists(session, page_size=308):
+        """按页拉取全部清单（每页 308 条），直到取不满一页"""
+        checklist_data, seen, row = [], set(), 1
+        while True:
+            url = f"https://ebird.org/mychecklists?year=&m=&d=&sharedFilter=all&currentRow={row}&rowsPerPage={page_size}"
+            response = session.get(url)
+            if response.status_code != 200:
+                raise Exception("无法访问 eBird 清单页面，请检查登录状态")
+            rows = EBirdChecklistManager.parse_checklists(response.text)
+            page = [item for item in rows if item['checklist ID'] not in seen]
+            seen.update(item['checklist ID'] for item in page)
+            checklist_data.extend(page)
+            # 是否最后一页按去重前的行数判断：翻页期间有新清单时页面会错位一行，去重后不满一页也不能停
+            if len(rows) < page_size:
+                break
+            # 服务器忽略 currentRow、重复返回同一页时，这一页不会有新清单，也要停下
+            if not page:
+                break
+            row += page_size
+        return checklist_data
+
+    @staticmethod
+    def parse_checklists(html):
+        """从 mychecklists 页面 HTML 中提取清单列表"""
+        soup = BeautifulSoup(html, 'html.parser')
         checklist_data = []
 
         # 解析 eBird 的清单行 (根据常见 HTML 结构)
@@ -14,34 +14,36 @@ from requests.adapters import HTTPAdapter
 from EBirdSessionManager import EBirdSessionManager
 
 
+def load_species_dict(library_path):
+    """预加载鸟种库，解决拉丁名匹配问题：{小写中文名: [中文名, 拉丁名, 英文名, ebird名]}"""
+    if not os.path.exists(library_path):
+        print(f"[-] 警告: 库文件 {library_path} 不存在")
+        return {}
+    try:
+        df = pd.read_csv(library_path, dtype=str)
+        # 使用小写拉丁名作为键，实现不区分大小写的匹配
+        return {
+            str(cn).strip().lower(): [cn, str(latin).strip(), eng, ebird]
+            for latin, cn, eng, ebird in zip(df['拉丁名'], df['中文名'],df['英文名'],df['ebird'],) if pd.notna(latin)
+        }
+    except Exception as e:
+        print(f"[-] 库文件加载失败: {e}")
+        return {}
+
+
 class EBirdMediaUploader(EBirdSessionManager):
 
-    def __init__(self, library_path):
+    def __init__(self, library_path, policy_wait=5):
         self.library_path = library_path
+        self.policy_wait = policy_wait  # 获取 Policy 后等待秒数，压测时可设为 0
         self.session = requests.Session()
         self.session.headers.update({
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
         })
-        self.species_dict = self._load_species_library()
+        self.species_dict = load_species_dict(library_path)
         super().__init__()
         self.get_valid_session()
 
-    def _load_species_library(self):
-        """预加载鸟种库，解决拉丁名匹配问题"""
-        if not os.path.exists(self.library_path):
-            print(f"[-] 警告: 库文件 {self.library_path} 不存在")
-            return {}
-        try:
-            df = pd.read_csv(self.library_path, dtype=str)
-            # 使用小写拉丁名作为键，实现不区分大小写的匹配
-            return {
-                str(cn).strip().lower(): [cn, str(latin).strip(), eng, ebird]
-                for latin, cn, eng, ebird in zip(df['拉丁名'], df['中文名'],df['英文名'],df['ebird'],) if pd.notna(latin)
-            }
-        except Exception as e:
-            print(f"[-] 库文件加载失败: {e}")
-            return {}
-
     def get_checklist_info(self, checklist_id):
         """2. 解析流程：获取清单中的 obsId, speciesCode 和 CSRF Token"""
         print(f"[*] 正在解析清单 {checklist_id}...")
@@ -83,7 +85,7 @@ class EBirdMediaUploader(EBirdSessionManager):
                                   params={"fileName": file_name, "md5sum": md5_val, "contentType": "image/jpeg"})
         if resp_p.status_code != 200: return False
         p_data = resp_p.json()
-        time.sleep(5)
+        time.sleep(self.policy_wait)
         # B. 上传至 S3 存储桶
         session = requests.Session()
         # 定义重试策略：针对连接错误和特定状态码重试 3 次
@@ -100,6 +102,9 @@ class EBirdMediaUploader(EBirdSessionManager):
             except requests.exceptions.ConnectionError as e:
                 print(f"上传失败，触发 10054 错误: {e}")
                 return False
+            except requests.exceptions.RequestException as e:
+                print(f"上传失败: {e}")
+                return False
         # with open(file_path, 'rb') as f:
         #     # S3 上传不带 Session Headers
         #     requests.post(p_data['uploadUrl'], data=p_data['policy'], files={'file': f})
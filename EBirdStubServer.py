@@ -0,0 +1,405 @@
+import os
+import re
+import json
+import contextlib
+import time
+import random
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import pandas as pd
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+
+class EBirdStubServer:
+    """本地替身服务：模拟 eBird / S3 / 观鸟记录中心接口，用于离线压测，不碰真实账号"""
+
+    def __init__(self, library_path, checklist_count=50, species_per_checklist=40, latency=0.0, jitter=0.0,
+                 error_rate=0.0, fixtures_dir=None, seed=0, name_resolver=None):
+        self.library_path = library_path
+        self.checklist_count = checklist_count
+        self.species_per_checklist = species_per_checklist
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fixtures_dir = fixtures_dir
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next_id = 1
+        # 服务端计数：客户端的 urllib3 Retry 会吞掉重试，只有这里能看到每一次请求和注入的错误
+        self.stats = {}
+
+        self.species_pool = self._load_species_pool()
+        self.checklists = self._build_checklists(seed)
+        # 观鸟记录中心上的鸟种名：默认用中文名，压测时传入 BirdReportSync 的查名逻辑保持一致
+        self.name_resolver = name_resolver or (lambda species: species.split("(")[0].strip())
+        self.activities = self._seed_activities()
+
+        self.httpd = None
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """在后台线程启动服务，端口由系统分配"""
+        stub = self
+
+        class Handler(_StubRequestHandler):
+            server_stub = stub
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"[+] 替身服务已启动: {self.base_url}")
+        return self
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------------- 造数 ----------------
+
+    def _load_species_pool(self):
+        """从合并鸟种库取鸟种，清单页上的名字与上传脚本的查表逻辑保持一致"""
+        df = pd.read_csv(self.library_path, dtype=str)
+        df = df[df['中文名'].notna() & df['拉丁名'].notna()]
+        pool = []
+        for i, (cn, latin, eng, ebird) in enumerate(zip(df['中文名'], df['拉丁名'], df['英文名'], df['ebird'])):
+            pool.append({
+                "cn": str(cn).strip(),
+                "latin": str(latin).strip(),
+                "en": str(eng).strip() if pd.notna(eng) else "",
+                # 清单页显示的名字：有手动维护的 ebird 名则用之
+                "display": str(ebird).strip() if pd.notna(ebird) else str(cn).strip(),
+                "code": f"sp{i:05d}",
+            })
+        return pool
+
+    def _build_checklists(self, seed):
+        """生成一批清单：一半在中国（江苏），一半在马来西亚，日期从新到旧"""
+        checklists = {}
+        start = datetime(2026, 2, 22, 15, 44)
+        per_list = min(self.species_per_checklist, len(self.species_pool))
+        for i in range(self.checklist_count):
+            sub_id = f"S{300000000 + i}"
+            rng = random.Random(f"{seed}-{sub_id}")
+            is_china = i % 2 == 0
+            species = []
+            for j, sp in enumerate(rng.sample(self.species_pool, per_list)):
+                species.append(dict(sp, obs_id=f"OBS{(i * 1000 + j):09d}", count=rng.randint(1, 30)))
+            checklists[sub_id] = {
+                "sub_id": sub_id,
+                "dt": start - timedelta(days=i, minutes=rng.randint(0, 600)),
+                "duration": rng.randint(15, 300),
+                "location": "虞山国家森林公园" if is_china else "Perdana Botanical Garden",
+                "state": "Jiangsu" if is_china else "Kuala Lumpur",
+                "country": "China" if is_china else "Malaysia",
+                "county": "Suzhou" if is_china else "Kuala Lumpur",
+                "species": species,
+            }
+        return checklists
+
+    def _seed_activities(self):
+        """预置观鸟记录中心活动：中国清单大部分已同步，另有缺失、过期（数量改过）和重复同步的样本"""
+        activities = {}
+        china = [c for c in self.checklists.values() if c["country"] == "China"]
+        for i, c in enumerate(china):
+            kind = i % 10
+            if kind == 3:  # 缺失
+                continue
+            records = [[self.name_resolver(f'{sp["cn"]} ({sp["latin"]})'), sp["count"]] for sp in c["species"]]
+            if kind == 5 and records:  # 过期：eBird 上改了数量
+                records[0][1] += 1
+            for _ in range(2 if kind == 7 else 1):  # 重复同步
+                activity_id = self._new_id()
+                activities[activity_id] = {"id": activity_id, "note": f"Imported from eBird {c['sub_id']}",
+                                           "start_time": c["dt"].strftime("%Y-%m-%d %H:%M:%S"), "records": records}
+        return activities
+
+    def reset_activities(self):
+        """恢复预置的观鸟记录中心活动，丢弃同步场景通过 saveReport 新建的活动"""
+        activities = self._seed_activities()
+        with self._lock:
+            self.activities = activities
+
+    def checklist_for_photos(self):
+        """返回照片上传场景使用的清单及其鸟种（文件名用中文名）"""
+        checklist = next(iter(self.checklists.values()))
+        return checklist["sub_id"], [sp["cn"] for sp in checklist["species"]]
+
+    def _new_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def _fixture(self, name):
+        """录制的真实页面优先：fixtures 目录下有同名文件就直接返回"""
+        if not self.fixtures_dir:
+            return None
+        path = os.path.join(self.fixtures_dir, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    # ---------------- 页面与接口 ----------------
+
+    def render_mychecklists(self, current_row=1, rows_per_page=None):
+        items = []
+        checklists = list(self.checklists.values())
+        start = max(current_row, 1) - 1
+        for c in checklists[start:start + rows_per_page] if rows_per_page else checklists[start:]:
+            items.append(
+                f'<li class="ResultsStats ResultsStats--manageMyChecklists" id="checklist-{c["sub_id"]}">'
+                f'<a href="/checklist/{c["sub_id"]}">'
+                f'<span class="Heading-main">{c["dt"].strftime("%d %b %Y")}</span>'
+                f'<span class="Heading-sub">{c["dt"].strftime("%I:%M %p").lstrip("0")}</span></a>'
+                f'<div class="ResultsStats-details-location">{c["location"]}</div>'
+                f'<span class="ResultsStats-details-county">{c["county"]}</span>'
+                f'<span class="ResultsStats-details-stateCountry">{c["state"]}</span>'
+                f'<span class="ResultsStats-details-stateCountry">{c["country"]}</span>'
+                f'</li>'
+            )
+        return f'<html><body><ol>{"".join(items)}</ol><a>Sign Out</a></body></html>'
+
+    def render_checklist(self, sub_id):
+        c = self.checklists[sub_id]
+        rows = []
+        for sp in c["species"]:
+            rows.append(
+                f'<li data-observation="{sp["obs_id"]}">'
+                f'<a data-species-code="{sp["code"]}"><span class="Heading-main">{sp["display"]}</span>'
+                f'<span class="Heading-sub">{sp["latin"]}</span></a>'
+                f'<button data-obsid="{sp["obs_id"]}">添加媒体</button></li>'
+            )
+        return (f'<html><body><checklist-featured-media rating-csrf="csrf-{sub_id}"></checklist-featured-media>'
+                f'<ol>{"".join(rows)}</ol></body></html>')
+
+    def render_download_csv(self, sub_id):
+        """与 eBird checklist/download 导出的列保持一致"""
+        c = self.checklists[sub_id]
+        df = pd.DataFrame([{
+            "Submission ID": sub_id,
+            "Species": f'{sp["cn"]} ({sp["latin"]})',
+            "Count": sp["count"],
+            "State/Province": c["state"],
+            "County": c["county"],
+            "Location": c["location"],
+            "Observation Date": c["dt"].strftime("%b %d, %Y"),
+            "Start Time": c["dt"].strftime("%I:%M %p"),
+            "Protocol": "Traveling",
+            "Duration": _format_duration(c["duration"]),
+            "All Obs Reported": 1,
+        } for sp in c["species"]])
+        return df.to_csv(index=False)
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {}
+
+    def snapshot_stats(self):
+        """返回 {接口: {"requests": 次数, "errors": 4xx/5xx 次数, "injected": 注入的 503 次数}}"""
+        with self._lock:
+            return {endpoint: dict(item) for endpoint, item in self.stats.items()}
+
+    def _count(self, endpoint, status, injected):
+        with self._lock:
+            item = self.stats.setdefault(endpoint, {"requests": 0, "errors": 0, "injected": 0})
+            item["requests"] += 1
+            item["errors"] += status >= 400
+            item["injected"] += injected
+
+    def handle(self, method, host, path, query, body):
+        """路由：返回 (状态码, Content-Type, 响应体)，同时按接口计数"""
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        if self.error_rate and self.random.random() < self.error_rate:
+            self._count(f"{host}{path}", 503, True)
+            return 503, "text/plain", b"Service Unavailable (injected)"
+
+        result = self._route(method, host, path, query, body)
+        self._count(f"{host}{path}", result[0], False)
+        return result
+
+    def _render_mychecklists_fixture(self, current_row, rows_per_page):
+        """录制的清单页：优先 mychecklists_<currentRow>.html，否则按 currentRow/rowsPerPage 切 mychecklists.html"""
+        page = self._fixture(f"mychecklists_{current_row}.html")
+        if page is not None:
+            return page
+        page = self._fixture("mychecklists.html")
+        if page is None:
+            return None
+
+        soup = BeautifulSoup(page, 'html.parser')
+        start = max(current_row, 1) - 1
+        end = start + rows_per_page if rows_per_page else None
+        for i, row in enumerate(soup.select('li.ResultsStats--manageMyChecklists')):
+            if i < start or (end is not None and i >= end):
+                row.decompose()
+        return str(soup)
+
+    def _route(self, method, host, path, query, body):
+        if host == "ebird.org":
+            if path == "/mychecklists":
+                current_row = int(query.get("currentRow", ["1"])[0] or 1)
+                rows_per_page = int(query.get("rowsPerPage", ["0"])[0] or 0)
+                page = self._render_mychecklists_fixture(current_row, rows_per_page)
+                return 200, "text/html", page or self.render_mychecklists(current_row, rows_per_page)
+
+            m = re.match(r"^/checklist/(S\d+)$", path)
+            if m and method == "GET":
+                sub_id = m.group(1)
+                page = self._fixture(f"checklist_{sub_id}.html")
+                if page is None and sub_id not in self.checklists:
+                    return 404, "text/plain", "unknown checklist"
+                return 200, "text/html", page or self.render_checklist(sub_id)
+
+            if path == "/ebird/checklist/download":
+                sub_id = query.get("subID", [""])[0]
+                data = self._fixture(f"download_{sub_id}.csv")
+                if data is None and sub_id not in self.checklists:
+                    return 404, "text/plain", "unknown checklist"
+                return 200, "text/csv", data or self.render_download_csv(sub_id)
+
+            if re.match(r"^/media-upload/checklist/S\d+/policy$", path):
+                asset_id = self._new_id()
+                return 200, "application/json", {
+                    "uploadUrl": "https://ebird-media-upload.s3.amazonaws.com/",
+                    "policy": {"key": f"uploads/{asset_id}/{query.get('fileName', [''])[0]}",
+                               "Content-MD5": query.get("md5sum", [""])[0]},
+                    "assetId": asset_id,
+                }
+
+            if re.match(r"^/media-assets/add/S\d+$", path) and method == "POST":
+                return 200, "application/json", {"success": True}
+
+        if host == "ebird-media-upload.s3.amazonaws.com" and method == "POST":
+            return 204, "text/plain", b""
+
+        if host == "api.birdreport.cn" and method == "POST":
+            payload = json.loads(body or b"{}") if body[:1] in (b"{", b"[") else {}
+            if path == "/member/system/activity/saveReport":
+                activity_id = self._new_id()
+                activity = payload.get("activity", {})
+                with self._lock:
+                    self.activities[activity_id] = {"id": activity_id, "note": activity.get("note", ""),
+                                                    "start_time": activity.get("start_time", ""), "records": []}
+                return 200, "application/json", {"code": 0, "data": {"activity_id": activity_id}}
+            if path == "/member/system/activity/list":
+                page, limit = int(payload.get("page", 1)), int(payload.get("limit", 20))
+                with self._lock:
+                    items = sorted(self.activities.values(), key=lambda a: -a["id"])
+                rows = [{k: a[k] for k in ("id", "note", "start_time")} for a in items[(page - 1) * limit:page * limit]]
+                return 200, "application/json", {"code": 0, "count": len(items), "data": rows}
+            if path == "/member/system/activity/taxon":
+                activity = self.activities.get(int(payload.get("activity_id", 0)))
+                if activity is None:
+                    return 404, "application/json", {"code": 404, "msg": "activity not found"}
+                return 200, "application/json", {"code": 0, "data": [
+                    {"taxon_name": name, "taxon_count": count} for name, count in activity["records"]]}
+            if path == "/member/system/upload/excel":
+                # 不解析 xls，按清单鸟种数回填 taxon 记录
+                return 200, "application/json", {"code": 0, "data": [
+                    {"taxon_id": 1000 + i, "taxon_count": 1, "uuid": f"u{self._new_id()}"}
+                    for i in range(self.species_per_checklist)
+                ]}
+            if path in ("/member/system/upload/pushTaxon", "/member/system/activity/updateOptions"):
+                return 200, "application/json", {"code": 0, "msg": "success"}
+
+        return 404, "text/plain", b"not found"
+
+
+class _StubRequestHandler(BaseHTTPRequestHandler):
+    """把 /<原始域名>/<原始路径> 形式的请求交给 EBirdStubServer 处理"""
+    server_stub = None
+    protocol_version = "HTTP/1.1"
+    # 响应头和响应体分两次写出，不关 Nagle 会被延迟 ACK 卡住约 40ms
+    disable_nagle_algorithm = True
+
+    def _dispatch(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        parts = urlsplit(self.path)
+        segments = parts.path.lstrip("/").split("/", 1)
+        host = segments[0]
+        path = "/" + (segments[1] if len(segments) > 1 else "")
+
+        status, content_type, payload = self.server_stub.handle(method, host, path, parse_qs(parts.query), body)
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload).encode("utf-8")
+        elif isinstance(payload, str):
+            payload = payload.encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def route_requests(stub, recorder=None):
+    """把进程内所有发往真实域名的请求改写到替身服务，并记录每个请求的耗时
+
+    在 HTTPAdapter.send 这一层改写，上传 S3 时自建的带重试 Session 也会经过这里
+    """
+    original_send = HTTPAdapter.send
+
+    def routed_send(adapter, request, **kwargs):
+        parts = urlsplit(request.url)
+        endpoint = f"{parts.netloc}{parts.path}"
+        request.url = f"{stub.base_url}/{endpoint}" + (f"?{parts.query}" if parts.query else "")
+
+        start = time.perf_counter()
+        try:
+            resp = original_send(adapter, request, **kwargs)
+            if not kwargs.get("stream"):
+                resp.content  # 计时包含读取响应体
+        except Exception:
+            if recorder:
+                recorder.add(endpoint, time.perf_counter() - start, None)
+            raise
+        if recorder:
+            recorder.add(endpoint, time.perf_counter() - start, resp.status_code)
+        return resp
+
+    HTTPAdapter.send = routed_send
+    try:
+        yield
+    finally:
+        HTTPAdapter.send = original_send
+
+
+def _format_duration(minutes):
+    h, m = divmod(minutes, 60)
+    parts = []
+    if h:
+        parts.append(f"{h} hour(s)")
+    if m:
+        parts.append(f"{m} minute(s)")
+    return ", ".join(parts)
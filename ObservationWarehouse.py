@@ -0,0 +1,255 @@
+import io
+import re
+import sqlite3
+import argparse
+import pandas as pd
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib3.util import Retry
+from requests.adapters import HTTPAdapter
+
+from EBirdSessionManager import EBirdSessionManager
+from EBirdChecklistManager import EBirdChecklistManager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checklists (
+    sub_id     TEXT PRIMARY KEY,
+    obs_date   TEXT,
+    start_time TEXT,
+    country    TEXT,
+    province   TEXT,
+    county     TEXT,
+    location   TEXT,
+    synced_at  TEXT
+);
+CREATE TABLE IF NOT EXISTS observations (
+    sub_id      TEXT NOT NULL REFERENCES checklists(sub_id),
+    obs_date    TEXT,
+    province    TEXT,
+    species     TEXT NOT NULL,
+    common_name TEXT,
+    latin       TEXT,
+    taxon       TEXT,
+    is_species  INTEGER,
+    count       INTEGER
+);
+CREATE TABLE IF NOT EXISTS species (
+    latin  TEXT,
+    ebird  TEXT,
+    cn     TEXT,
+    "order"  TEXT,
+    family TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_checklists_date ON checklists(obs_date);
+CREATE INDEX IF NOT EXISTS idx_checklists_province ON checklists(province);
+CREATE INDEX IF NOT EXISTS idx_observations_sub ON observations(sub_id);
+-- 鸟种列表查询只读这个索引，不回表
+CREATE INDEX IF NOT EXISTS idx_observations_taxon
+    ON observations(is_species, taxon, obs_date, sub_id, province, common_name);
+CREATE INDEX IF NOT EXISTS idx_species_latin ON species(latin);
+CREATE INDEX IF NOT EXISTS idx_species_ebird ON species(ebird);
+"""
+
+# 只统计到种：sp. / 杂交 / 斜线种不计入鸟种列表
+NON_SPECIES = re.compile(r" sp\.|/| x ")
+
+
+class ObservationWarehouse:
+    """本地观测记录库（SQLite）：每个鸟单只下载一次，按 subID 去重，鸟种列表类查询在本地完成"""
+
+    def __init__(self, db_path="resource/observations.db", library_path="resource/final_merged_birds.csv",
+                 secrets_path="secrets.ini", max_workers=8):
+        self.db_path = db_path
+        self.library_path = library_path
+        self.secrets_path = secrets_path
+        self.max_workers = max_workers
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # ---------------- 同步 ----------------
+
+    def load_species_library(self):
+        """把鸟种库（中文名、目、科）写入 species 表，同一拉丁名只保留第一行
+
+        默认用合并后的 final_merged_birds.csv（含境外鸟种），也兼容只有中国鸟种的 xlsx 鸟种库
+        """
+        if self.library_path.endswith(".xlsx"):
+            df = pd.read_excel(self.library_path, engine='openpyxl', dtype=str)
+        else:
+            df = pd.read_csv(self.library_path, dtype=str, encoding="utf-8-sig")
+        species = pd.DataFrame({
+            "latin": df['拉丁名'].str.strip(), "ebird": df['ebird'].str.strip(), "cn": df['中文名'].str.strip(),
+            "order": df['目'].str.strip(), "family": df['科'].str.strip(),
+        }).dropna(subset=["latin"]).drop_duplicates(subset=["latin"])
+        with self.conn:
+            self.conn.execute("DELETE FROM species")
+            self.conn.executemany('INSERT INTO species (latin, ebird, cn, "order", family) VALUES (?, ?, ?, ?, ?)',
+                                  species.astype(object).where(species.notna(), None).itertuples(index=False))
+        return len(species)
+
+    def synced_ids(self):
+        return {row[0] for row in self.conn.execute("SELECT sub_id FROM checklists")}
+
+    @staticmethod
+    def _download(session, sub_id):
+        """下载单个鸟单 CSV"""
+        resp = session.get(f"https://ebird.org/ebird/checklist/download?subID={sub_id}")
+        if resp.status_code != 200:
+            raise Exception(f"鸟单下载失败 ({resp.status_code})")
+        return pd.read_csv(io.StringIO(resp.text))
+
+    @staticmethod
+    def _to_rows(sub_id, df, meta):
+        """鸟单 CSV -> (清单行, 观测行列表)；省份优先用 CSV 里的 State/Province，没有再用清单页上的"""
+        first = df.iloc[0] if len(df) else {}
+        try:
+            obs_date = datetime.strptime(str(first.get('Observation Date', '')), "%b %d, %Y").strftime("%Y-%m-%d")
+        except ValueError:
+            parsed = pd.to_datetime(first.get('Observation Date'), errors='coerce')
+            obs_date = parsed.strftime("%Y-%m-%d") if pd.notna(parsed) else None
+
+        def pick(col, key):
+            value = first.get(col) if col in df.columns else None
+            return str(value).strip() if pd.notna(value) and str(value).strip() else (meta.get(key) or None)
+
+        countries = meta.get("国家") or []
+        checklist = (sub_id, obs_date, str(first.get('Start Time', '') or ''),
+                     countries[-1] if countries else None, pick('State/Province', "州/省"), pick('County', "郡/县"),
+                     pick('Location', "地点"), datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+        observations = []
+        for species, count in zip(df['Species'].astype(str), df['Count']):
+            brackets = re.findall(r'\(([^)]+)\)', species)
+            latin = brackets[-1].strip() if brackets else None
+            common = species.rsplit("(", 1)[0].strip() if brackets else species.strip()
+            taxon = latin or common  # 没有学名时用完整的英文名，不能截断
+            if latin and not NON_SPECIES.search(latin):
+                # 亚种/亚种组并到种（属名 + 种加词），完整学名仍保留在 latin / species 里
+                taxon = " ".join(latin.split()[:2])
+            # 日期、省份冗余存一份，鸟种列表聚合时不用再关联清单表
+            observations.append((sub_id, checklist[1], checklist[4], species, common, latin, taxon,
+                                 0 if NON_SPECIES.search(taxon) else 1, int(count) if str(count).isdigit() else None))
+        return checklist, observations
+
+    def sync(self, sub_ids=None, refresh=False, session=None):
+        """并发下载尚未入库的鸟单并写入；sub_ids 为空时同步 eBird 上的全部清单；可传入已登录的 session 复用"""
+        if session is None:
+            session, _ = EBirdSessionManager(self.secrets_path).get_valid_session()
+            if session is None:
+                print("[-] 无法获取 eBird 登录状态")
+                return 0
+            # 并发下载时连接池要够大；只重试 GET
+            retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+            session.mount('https://', HTTPAdapter(max_retries=retries, pool_maxsize=self.max_workers))
+
+        self.load_species_library()
+        meta = {}
+        if sub_ids is None:
+            try:
+                for item in EBirdChecklistManager.fetch_all_checklists(session):
+                    meta[item["checklist ID"]] = item
+            except Exception as e:
+                print(f"[-] 获取 eBird 清单列表失败: {e}")
+                return 0
+            sub_ids = list(meta)
+
+        synced = set() if refresh else self.synced_ids()
+        todo = [s for s in dict.fromkeys(sub_ids) if s not in synced]
+        print(f"[*] 共 {len(sub_ids)} 个清单，需下载 {len(todo)} 个")
+
+        def work(sub_id):
+            try:
+                return sub_id, self._download(session, sub_id), None
+            except Exception as e:
+                return sub_id, None, e
+
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            # 下载并发进行，写库在当前线程按清单逐个提交
+            for sub_id, df, error in pool.map(work, todo):
+                if error is not None:
+                    print(f"[-] {sub_id} 下载失败: {error}")
+                    continue
+                checklist, observations = self._to_rows(sub_id, df, meta.get(sub_id, {}))
+                with self.conn:
+                    self.conn.execute("DELETE FROM observations WHERE sub_id = ?", (sub_id,))
+                    self.conn.execute("INSERT OR REPLACE INTO checklists VALUES (?, ?, ?, ?, ?, ?, ?, ?)", checklist)
+                    self.conn.executemany("INSERT INTO observations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", observations)
+                done += 1
+
+        print(f"[+] 入库完成：新增/更新 {done} 个清单，失败 {len(todo) - done} 个")
+        return done
+
+    # ---------------- 查询 ----------------
+
+    def query(self, sql, params=()):
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def _first_records(self, group_by="", where="", params=()):
+        """每个（分组，鸟种）取最早一条记录：先在观测表的覆盖索引上聚合，再关联清单和鸟种库的中文名、目、科
+
+        鸟种库先按拉丁名对，对不上再按手动维护的 ebird 名，与 BirdReportSync 的查名顺序一致
+        """
+        group_cols = f"{group_by}, " if group_by else ""
+        return self.query(f"""
+            WITH firsts AS (
+                SELECT {group_cols}o.taxon, o.common_name, COUNT(*) AS n,
+                       MIN(IFNULL(o.obs_date, '9999-12-31') || ' ' || o.sub_id) AS first_key
+                FROM observations o
+                WHERE o.is_species = 1 {where}
+                GROUP BY {group_cols}o.taxon
+            )
+            SELECT COALESCE(s1.cn, s2.cn, f.common_name) AS 中文名, f.taxon AS 拉丁名,
+                   COALESCE(s1."order", s2."order") AS 目, COALESCE(s1.family, s2.family) AS 科,
+                   c.obs_date AS 首次日期, c.province AS 省份, c.location AS 地点, c.sub_id AS 清单, f.n AS 记录次数
+            FROM firsts f
+            JOIN checklists c ON c.sub_id = substr(f.first_key, 12)
+            LEFT JOIN species s1 ON s1.latin = f.taxon
+            LEFT JOIN species s2 ON s1.latin IS NULL AND s2.ebird = f.common_name
+            ORDER BY {"c.province, " if group_by else ""}首次日期, 清单
+        """, params)
+
+    def life_list(self):
+        """生涯鸟种：每种鸟的首次记录日期、地点和记录次数"""
+        return self._first_records()
+
+    def year_list(self, year):
+        """年度鸟种：指定年份内每种鸟的首次记录"""
+        return self._first_records(where="AND o.obs_date >= ? AND o.obs_date < ?",
+                                   params=(f"{year}-01-01", f"{int(year) + 1}-01-01"))
+
+    def first_by_province(self, province=None):
+        """各省份首次记录：每个省份里每种鸟第一次出现的日期和清单"""
+        if province:
+            return self._first_records("o.province", "AND o.province = ?", (province,))
+        return self._first_records("o.province")
+
+
+# ================= 运行 =================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地观测记录库：同步 eBird 鸟单并查询鸟种列表")
+    parser.add_argument("command", choices=["sync", "life", "year", "province"])
+    parser.add_argument("arg", nargs="?", help="year: 年份；province: 省份（可选）；sync: 逗号分隔的 subID（可选）")
+    parser.add_argument("--db", default="resource/observations.db")
+    parser.add_argument("--refresh", action="store_true", help="重新下载已入库的鸟单")
+    parser.add_argument("--output", help="查询结果另存为 CSV")
+    args = parser.parse_args()
+
+    warehouse = ObservationWarehouse(args.db)
+    if args.command == "sync":
+        warehouse.sync(args.arg.split(",") if args.arg else None, refresh=args.refresh)
+    else:
+        if args.command == "life":
+            result = warehouse.life_list()
+        elif args.command == "year":
+            result = warehouse.year_list(args.arg or datetime.now().year)
+        else:
+            result = warehouse.first_by_province(args.arg)
+        print(result.to_string(index=False))
+        print(f"[+] 共 {len(result)} 种")
+        if args.output:
+            result.to_csv(args.output, index=False, encoding="utf-8-sig")
+    warehouse.close()
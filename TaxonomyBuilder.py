@@ -0,0 +1,153 @@
+import os
+import re
+import argparse
+import requests
+import pandas as pd
+from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+
+AVIBASE_URL = "https://avibase.bsc-eoc.org/checklist.jsp?lang=ZH&region={region}&list=clements"
+COLS_ORDER = ['序号', '中文名', '备选中文名', '拉丁名', '英文名', '目', '科', 'ebird', 'birdreport']
+
+
+class TaxonomyBuilder:
+    """从 Avibase 多个地区的鸟种名录合并出 final_merged_birds.csv（以拉丁名为基准）"""
+
+    def __init__(self, output_path="resource/final_merged_birds.csv",
+                 library_path="resource/bird_species_library.xlsx",
+                 cache_dir="resource/avibase_cache", offline=False, max_workers=4):
+        self.output_path = output_path
+        self.library_path = library_path
+        self.cache_dir = cache_dir
+        self.offline = offline  # 离线模式：只读缓存目录里的 HTML，不联网
+        self.max_workers = max_workers
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": "Mozilla/5.0"})
+
+    def _cache_path(self, region):
+        return os.path.join(self.cache_dir, f"avibase_{region}.html")
+
+    def fetch_region_html(self, region, refresh=False):
+        """获取地区名录原始 HTML：有缓存用缓存，没有再下载并写入缓存"""
+        path = self._cache_path(region)
+        if os.path.exists(path) and not refresh:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        if self.offline:
+            raise FileNotFoundError(f"离线模式下找不到缓存: {path}")
+
+        print(f"[*] 正在下载 Avibase 名录: {region}")
+        resp = self.session.get(AVIBASE_URL.format(region=region), timeout=60)
+        resp.raise_for_status()
+        resp.encoding = 'utf-8'
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(resp.text)
+        return resp.text
+
+    @staticmethod
+    def parse_region(html):
+        """解析 Avibase 名录页：目/科标题行 + 鸟种行（英文名、拉丁名、中文名）"""
+        soup = BeautifulSoup(html, 'html.parser')
+        birds = []
+        current_order, current_family = "", ""
+
+        for row in soup.select("tr"):
+            header_text = row.get_text(strip=True)
+            if ":" in header_text and ("IDAE" in header_text.upper() or "IFORMES" in header_text.upper()):
+                parts = header_text.split(":")
+                current_order, current_family = parts[0].strip(), parts[1].strip()
+                continue
+
+            cols = row.find_all("td")
+            if len(cols) >= 3:
+                en = cols[0].get_text(strip=True)
+                la = cols[1].find("i").get_text(strip=True) if cols[1].find("i") else cols[1].get_text(strip=True)
+                # 清理中文名中的括号备注
+                cn = re.sub(r'[\(（].*?[\)）]', '', cols[2].get_text(strip=True)).strip()
+                if cn and en:
+                    birds.append({"中文名_新": cn, "拉丁名": la, "英文名": en, "目": current_order, "科": current_family})
+        return pd.DataFrame(birds, columns=["中文名_新", "拉丁名", "英文名", "目", "科"])
+
+    def fetch_regions(self, regions, refresh=False):
+        """并发获取并解析多个地区，按传入顺序拼接（同一拉丁名以靠前的地区为准）"""
+        def work(region):
+            df = self.parse_region(self.fetch_region_html(region, refresh))
+            print(f"[+] {region}: {len(df)} 种")
+            return df
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            frames = list(pool.map(work, regions))
+        avibase = pd.concat(frames, ignore_index=True)
+        avibase['拉丁名'] = avibase['拉丁名'].str.strip()
+        return avibase.drop_duplicates(subset=['拉丁名'], keep='first')
+
+    def _load_base(self, rebuild):
+        """增量合并以现有 final_merged_birds.csv 为底表；rebuild 时从鸟种库重新开始"""
+        if not rebuild and os.path.exists(self.output_path):
+            return pd.read_csv(self.output_path, dtype=str, encoding="utf-8-sig")
+        return pd.read_excel(self.library_path, engine='openpyxl', dtype=str)
+
+    @staticmethod
+    def reconcile(base, avibase):
+        """按拉丁名合并：旧表没中文名用新名，名字不同记入备选中文名，目/科/英文名只补空"""
+        for col in COLS_ORDER:
+            if col not in base.columns:
+                base[col] = pd.NA
+        base = base.assign(拉丁名=base['拉丁名'].str.strip())
+        merged = base.merge(avibase, on="拉丁名", how="outer", suffixes=('', '_new'))
+
+        cn_old = merged['中文名'].fillna("").astype(str).str.strip()
+        cn_new = merged['中文名_新'].fillna("").astype(str).str.strip()
+        alt = merged['备选中文名'].fillna("").astype(str).str.strip()
+
+        # 已记录过的别名不重复追加（重复合并同一地区结果不变）
+        known = pd.Series([n in a.split("/") for n, a in zip(cn_new, alt)], index=merged.index, dtype=bool)
+        is_alias = (cn_old != "") & (cn_new != "") & (cn_old != cn_new) & ~known
+        merged['备选中文名'] = alt.where(~is_alias, (alt + "/" + cn_new).str.lstrip("/"))
+        merged['中文名'] = cn_old.where(cn_old != "", cn_new)
+
+        for col in ['目', '科', '英文名']:
+            merged[col] = merged[col].replace("", pd.NA).fillna(merged[f'{col}_new'])
+
+        # 没有拉丁名的行不参与去重；去空格后撞拉丁名的行只留第一行，其余行的中文名并入备选中文名
+        collided = merged['拉丁名'].notna() & merged['拉丁名'].duplicated(keep=False)
+        for latin, rows in merged[collided].groupby('拉丁名', sort=False):
+            keep = rows.index[0]
+            names = [n for n in merged.at[keep, '备选中文名'].split("/") if n]
+            for name in list(rows['中文名'].iloc[1:]) + [n for a in rows['备选中文名'].iloc[1:] for n in a.split("/")]:
+                if name and name != merged.at[keep, '中文名'] and name not in names:
+                    names.append(name)
+            merged.at[keep, '备选中文名'] = "/".join(names)
+            print(f"[-] 警告: 拉丁名重复 {latin}: 保留 {merged.at[keep, '中文名']}，"
+                  f"并入 {'/'.join(rows['中文名'].iloc[1:])}")
+        merged = merged[~(merged['拉丁名'].duplicated(keep='first') & merged['拉丁名'].notna())]
+        merged = merged.sort_values(by=['目', '科']).reset_index(drop=True)
+        merged['序号'] = merged.index + 1
+        return merged[COLS_ORDER]
+
+    def build(self, regions, rebuild=False, refresh=False):
+        """合并指定地区并写出 CSV；加新国家时只需传入新地区，已合并的内容保留"""
+        avibase = self.fetch_regions(regions, refresh)
+        base = self._load_base(rebuild)
+        known = set(base['拉丁名'].dropna().str.strip())
+        final = self.reconcile(base, avibase)
+        added = (~final['拉丁名'].isin(known)).sum()
+        final.to_csv(self.output_path, index=False, encoding="utf-8-sig")
+        print(f"[+] 合并完成！总计鸟种：{len(final)}（新增 {added}），输出: {self.output_path}")
+        return final
+
+
+# ================= 运行 =================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="合并 Avibase 多地区鸟种名录到 final_merged_birds.csv")
+    parser.add_argument("regions", nargs="+", help="Avibase 地区代码，如 my cn th")
+    parser.add_argument("--offline", action="store_true", help="只使用缓存目录里的 HTML")
+    parser.add_argument("--refresh", action="store_true", help="忽略缓存重新下载")
+    parser.add_argument("--rebuild", action="store_true", help="从鸟种库重新合并，而不是在现有 CSV 上增量合并")
+    parser.add_argument("--cache-dir", default="resource/avibase_cache")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    builder = TaxonomyBuilder(cache_dir=args.cache_dir, offline=args.offline, max_workers=args.workers)
+    builder.build(args.regions, rebuild=args.rebuild, refresh=args.refresh)
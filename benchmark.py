@@ -0,0 +1,319 @@
+import os
+import io
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+
+from EBirdStubServer import EBirdStubServer, route_requests
+from EBirdMediaUploader import EBirdMediaUploader, load_species_dict
+from EBirdChecklistManager import EBirdChecklistManager
+from BirdReportSync import BirdReportSync, load_species_library, SpeciesNameLookup
+from BirdReportReconcile import BirdReportReconciler
+from ObservationWarehouse import ObservationWarehouse
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MERGED_LIBRARY = os.path.join(ROOT, "resource", "final_merged_birds.csv")
+SPECIES_LIBRARY = os.path.join(ROOT, "resource", "bird_species_library.xlsx")
+POINTS_CSV = os.path.join(ROOT, "resource", "chinese_points.csv")
+BENCH_POINT_ID = 200828
+
+
+class Recorder:
+    """线程安全地记录每个请求的接口、耗时和状态码"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records = []
+
+    def add(self, endpoint, elapsed, status):
+        with self._lock:
+            self.records.append((endpoint, elapsed, status))
+
+    def reset(self):
+        with self._lock:
+            self.records = []
+
+    def summary(self):
+        by_endpoint = {}
+        for endpoint, elapsed, status in self.records:
+            by_endpoint.setdefault(_normalize_endpoint(endpoint), []).append((elapsed, status))
+
+        endpoints = {}
+        for endpoint, items in sorted(by_endpoint.items()):
+            times = sorted(e for e, _ in items)
+            endpoints[endpoint] = {
+                "count": len(items),
+                "errors": sum(1 for _, s in items if s is None or s >= 400),
+                "p50_ms": _percentile(times, 50) * 1000,
+                "p95_ms": _percentile(times, 95) * 1000,
+                "max_ms": times[-1] * 1000,
+            }
+        return endpoints
+
+
+@contextlib.contextmanager
+def bench_workdir():
+    """在临时目录里准备 secrets.ini 和点位表，避免改动真实配置文件"""
+    old_cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="neatenit_bench_")
+    os.makedirs(os.path.join(workdir, "resource"))
+    shutil.copy(POINTS_CSV, os.path.join(workdir, "resource", "chinese_points.csv"))
+    with open(os.path.join(workdir, "secrets.ini"), "w", encoding="utf-8") as f:
+        f.write("[ebird]\nusername = bench\npassword = bench\ncookie_string = EBIRD_SESSIONID=bench\n\n"
+                "[birdreport]\ntoken = bench-token\nmember_id = 1\n")
+    os.chdir(workdir)
+    try:
+        yield workdir
+    finally:
+        os.chdir(old_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ================= 场景 =================
+
+def scenario_upload(stub, args, photo_count):
+    """文件夹上传：按清单鸟种生成 photo_count 张 "鸟名_Y*.jpg"，跑完整的 Policy -> S3 -> 关联流程"""
+    checklist_id, names = stub.checklist_for_photos()
+    folder = os.path.join(os.getcwd(), f"photos_{photo_count}")
+    os.makedirs(folder)
+    payload = os.urandom(args.photo_kb * 1024)
+    for i in range(photo_count):
+        with open(os.path.join(folder, f"{names[i % len(names)]}_Y_{i:05d}.jpg"), "wb") as f:
+            f.write(payload)
+
+    uploader = EBirdMediaUploader(MERGED_LIBRARY, policy_wait=args.policy_wait)
+    uploader.run_folder_upload(checklist_id, folder)
+
+    done = sum(1 for name in os.listdir(folder) if "_YY" in name)
+    shutil.rmtree(folder, ignore_errors=True)
+    return photo_count, photo_count - done, {}
+
+
+def scenario_checklist_sync(stub, args):
+    """批量清单同步：更新本地观鸟记录表，再把所有中国清单同步到观鸟记录中心"""
+    manager = EBirdChecklistManager("观鸟记录表.csv", "birding_notes.md")
+    start = time.perf_counter()
+    manager.sync_data()
+    header_s = time.perf_counter() - start
+
+    syncer = BirdReportSync("secrets.ini", SPECIES_LIBRARY)
+    china_ids = [c["sub_id"] for c in stub.checklists.values() if c["country"] == "China"]
+    failed = 0
+    for sub_id in china_ids:
+        try:
+            syncer.sync_to_birdreport(sub_id, BENCH_POINT_ID)
+        except Exception as e:
+            print(f"[-] 同步失败 {sub_id}: {e}")
+            failed += 1
+    return len(china_ids), failed, {"header_sync_s": header_s, "checklists": len(stub.checklists)}
+
+
+def scenario_species_library(stub, args):
+    """鸟种库加载：CSV / Excel 两份库的加载耗时，以及按清单鸟名查中文名的吞吐"""
+    start = time.perf_counter()
+    load_species_dict(MERGED_LIBRARY)
+    csv_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    species_df = load_species_library(SPECIES_LIBRARY)
+    xlsx_s = time.perf_counter() - start
+
+    lookup = SpeciesNameLookup(species_df)
+    names = [f'{sp["cn"]} ({sp["latin"]})' for c in stub.checklists.values() for sp in c["species"]]
+    for name in names:
+        lookup.cn_name(name)
+    return len(names), 0, {"load_csv_s": csv_s, "load_xlsx_s": xlsx_s}
+
+
+def scenario_reconcile(stub, args):
+    """对账：拉取全部活动和 eBird 清单，比对已同步清单的鸟种/数量指纹；连跑两次，第二次 eBird 鸟单全部读本地库"""
+    # 批量同步场景新建的活动没有鸟种记录，会全部算成过期；对账前恢复预置数据，与场景顺序无关
+    stub.reset_activities()
+    if os.path.exists("reconcile.db"):
+        os.remove("reconcile.db")
+    reconciler = BirdReportReconciler("secrets.ini", SPECIES_LIBRARY, max_workers=args.workers, db_path="reconcile.db")
+    extra = {}
+    for run in ("cold", "warm"):
+        before = _downloads(stub)
+        start = time.perf_counter()
+        report = reconciler.reconcile("reconcile")
+        extra[f"{run}_s"] = time.perf_counter() - start
+        extra[f"{run}_downloads"] = _downloads(stub) - before
+    reconciler.warehouse.close()
+    extra.update({k: len(v) for k, v in report.items()})
+    china = sum(1 for c in stub.checklists.values() if c["country"] == "China")
+    return china, len(report["failed"]), extra
+
+
+def _downloads(stub):
+    """替身服务上鸟单 CSV 的下载次数（含重试）"""
+    return sum(item["requests"] for endpoint, item in stub.snapshot_stats().items() if "checklist/download" in endpoint)
+
+
+def scenario_warehouse(stub, args):
+    """观测记录库：并发下载全部鸟单入库，再同步一次验证去重，最后计时本地查询"""
+    warehouse = ObservationWarehouse("observations.db", MERGED_LIBRARY, max_workers=args.workers)
+    start = time.perf_counter()
+    synced = warehouse.sync()
+    extra = {"sync_s": time.perf_counter() - start, "resync_downloads": warehouse.sync()}
+
+    year = next(iter(stub.checklists.values()))["dt"].year
+    for name, run in [("life_list", warehouse.life_list), ("year_list", lambda: warehouse.year_list(year)),
+                      ("first_by_province", warehouse.first_by_province)]:
+        start = time.perf_counter()
+        rows = len(run())
+        extra[f"{name}_ms"] = (time.perf_counter() - start) * 1000
+        extra[f"{name}_rows"] = rows
+    warehouse.close()
+    return len(stub.checklists), len(stub.checklists) - synced, extra
+
+
+def species_name_resolver():
+    """与 BirdReportSync 相同的查名逻辑，替身服务用它生成观鸟记录中心上的鸟种名"""
+    return SpeciesNameLookup(load_species_library(SPECIES_LIBRARY)).cn_name
+
+
+SCENARIOS = {
+    "upload_100": lambda stub, args: scenario_upload(stub, args, 100),
+    "upload_1000": lambda stub, args: scenario_upload(stub, args, 1000),
+    "reconcile": scenario_reconcile,
+    "checklist_sync": scenario_checklist_sync,
+    "warehouse": scenario_warehouse,
+    "species_library": scenario_species_library,
+}
+
+
+def run_scenario(name, stub, recorder, args):
+    recorder.reset()
+    stub.reset_stats()
+    out = io.StringIO()
+    start = time.perf_counter()
+    error = None
+    try:
+        with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(out):
+            ops, failed, extra = SCENARIOS[name](stub, args)
+    except Exception as e:
+        # 一个场景出错不影响其余场景，错误记进结果里
+        ops, failed, extra, error = 0, 0, {}, f"{type(e).__name__}: {e}"
+    wall = time.perf_counter() - start
+
+    endpoints = recorder.summary()
+    # 合并服务端计数：客户端的重试在 HTTPAdapter.send 之下，只有服务端能看到每一次尝试
+    server = {}
+    for endpoint, item in stub.snapshot_stats().items():
+        merged = server.setdefault(_normalize_endpoint(endpoint), {"requests": 0, "errors": 0, "injected": 0})
+        for k, v in item.items():
+            merged[k] += v
+    for endpoint, item in server.items():
+        e = endpoints.setdefault(endpoint, {"count": 0, "errors": 0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0})
+        e["server_requests"], e["server_errors"], e["injected"] = item["requests"], item["errors"], item["injected"]
+    for e in endpoints.values():
+        e.setdefault("server_requests", 0)
+        e.setdefault("server_errors", 0)
+        e.setdefault("injected", 0)
+    endpoints = dict(sorted(endpoints.items()))
+
+    return {
+        "scenario": name,
+        "ops": ops,
+        "failed": failed,
+        "wall_s": wall,
+        "ops_per_s": ops / wall if wall else 0.0,
+        "requests": sum(e["count"] for e in endpoints.values()),
+        "http_errors": sum(e["errors"] for e in endpoints.values()),
+        "server_requests": sum(e["server_requests"] for e in endpoints.values()),
+        "server_errors": sum(e["server_errors"] for e in endpoints.values()),
+        "injected_errors": sum(e["injected"] for e in endpoints.values()),
+        "extra": extra,
+        "endpoints": endpoints,
+        "error": error,
+    }
+
+
+def print_report(results):
+    for r in results:
+        print(f"\n=== {r['scenario']} ===")
+        if r["error"]:
+            print(f"[-] 场景出错: {r['error']}")
+        print(f"操作数 {r['ops']}  失败 {r['failed']}  总耗时 {r['wall_s']:.2f}s  吞吐 {r['ops_per_s']:.1f} ops/s  "
+              f"请求 {r['requests']}  HTTP 错误 {r['http_errors']}  "
+              f"服务端请求 {r['server_requests']}  服务端错误 {r['server_errors']}（注入 {r['injected_errors']}）")
+        for k, v in r["extra"].items():
+            print(f"  {k}: {v:.3f}" if isinstance(v, float) else f"  {k}: {v}")
+        if r["endpoints"]:
+            print(f"  {'接口':<55}{'次数':>6}{'错误':>6}{'服务端':>7}{'注入':>6}{'p50ms':>9}{'p95ms':>9}{'maxms':>9}")
+            for endpoint, e in r["endpoints"].items():
+                print(f"  {endpoint:<57}{e['count']:>6}{e['errors']:>6}{e['server_requests']:>10}{e['injected']:>8}"
+                      f"{e['p50_ms']:>9.1f}{e['p95_ms']:>9.1f}{e['max_ms']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线压测：用本地替身服务代替 eBird / S3 / 观鸟记录中心")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS), help=f"可选: {', '.join(SCENARIOS)}")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的模拟延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟抖动幅度（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入 503 的概率，0~1")
+    parser.add_argument("--checklists", type=int, default=50, help="替身服务上的清单数量")
+    parser.add_argument("--species", type=int, default=40, help="每个清单的鸟种数")
+    parser.add_argument("--photo-kb", type=int, default=64, help="每张测试照片大小（KB）")
+    parser.add_argument("--policy-wait", type=float, default=0.0, help="获取 Policy 后的等待秒数（正式上传为 5）")
+    parser.add_argument("--fixtures", help="录制的页面目录：mychecklists.html / checklist_<subID>.html / download_<subID>.csv")
+    parser.add_argument("--workers", type=int, default=8, help="对账 / 观测记录库场景的并发数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="结果另存为 JSON，便于对比回归")
+    parser.add_argument("--verbose", action="store_true", help="显示被测代码自身的输出")
+    args = parser.parse_args()
+
+    unknown = [s for s in args.scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+    if args.fixtures:
+        # 压测在临时目录里运行，相对路径要先转成绝对路径
+        args.fixtures = os.path.abspath(args.fixtures)
+        if not os.path.isdir(args.fixtures):
+            parser.error(f"录制目录不存在: {args.fixtures}")
+
+    stub = EBirdStubServer(MERGED_LIBRARY, checklist_count=args.checklists, species_per_checklist=args.species,
+                           latency=args.latency / 1000, jitter=args.jitter / 1000, error_rate=args.error_rate,
+                           fixtures_dir=args.fixtures, seed=args.seed, name_resolver=species_name_resolver())
+    recorder = Recorder()
+    results = []
+    with stub, route_requests(stub, recorder), bench_workdir():
+        for name in args.scenarios:
+            print(f"[*] 运行场景: {name}")
+            results.append(run_scenario(name, stub, recorder, args))
+            if results[-1]["error"]:
+                print(f"[-] 场景 {name} 出错: {results[-1]['error']}")
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n[+] 结果已保存: {args.json}")
+
+
+def _normalize_endpoint(endpoint):
+    """把 subID / 数字 ID 归一化，便于按接口聚合"""
+    parts = []
+    for seg in endpoint.split("/"):
+        if seg[:1] == "S" and seg[1:].isdigit():
+            seg = "{subID}"
+        elif seg.isdigit():
+            seg = "{id}"
+        parts.append(seg)
+    return "/".join(parts)
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+if __name__ == "__main__":
+    main()